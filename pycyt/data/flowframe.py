@@ -324,55 +324,92 @@ class FlowFrame(AutoIDMixin):
 		Returns:
 			pandas.DataFrame, or pandas.Series if single channel selected.
 		"""
+		# Look up handler by exact type first, only going through the
+		# isinstance checks for other types (e.g. subclasses)
+		handler = self._getitem_handlers.get(type(idx))
+
+		if handler is None:
+			if isinstance(idx, basestring):
+				handler = FlowFrame._getitem_channel
+			elif isinstance(idx, list):
+				handler = FlowFrame._getitem_list
+			elif isinstance(idx, tuple):
+				handler = FlowFrame._getitem_tuple
+			else:
+				handler = FlowFrame._getitem_rows
+
+		return handler(self, idx)
+
+	def _getitem_channel(self, idx):
 		# String - single channel
-		if isinstance(idx, basestring):
-			return self.data[idx]
+		return self.data[idx]
 
-		# List - ambiguous, need to check contents
-		elif isinstance(idx, list):
+	def _getitem_list(self, idx):
+		# List - ambiguous, convert to array once and check its dtype
+		arr = np.asarray(idx)
 
-			# Of strings - subset of channels
-			if isinstance(idx[0], basestring):
-				return self.data[idx]
+		# Empty - no rows
+		if arr.size == 0:
+			return self.data.iloc[:0]
 
-			# Otherwise assume ints or bools to index rows
-			else:
-				return self.data.iloc[idx]
+		# Of strings - subset of channels
+		elif arr.dtype.kind in 'SU':
+			return self.data[idx]
 
-		# Tuple - rows and channels
-		elif isinstance(idx, tuple):
+		# Of ints or bools - index rows with the array
+		elif arr.dtype.kind in 'iub':
+			return self.data.iloc[arr]
 
-			rows, channels = idx
+		else:
+			raise TypeError(
+				'List index must contain channel names, or ints or bools to '
+				'select rows')
 
-			# Get correct channels first
-			if isinstance(channels, basestring): # Channel name
+	def _getitem_tuple(self, idx):
+		# Tuple - rows and channels
+		rows, channels = idx
+
+		# Get correct channels first
+		if isinstance(channels, basestring): # Channel name
+			df = self.data[channels]
+		elif isinstance(channels, (int, long)): # Channel index
+			df = self.data[self._channels[channels]]
+		elif isinstance(channels, list):
+			if isinstance(channels[0], basestring): # List of names
 				df = self.data[channels]
-			elif isinstance(channels, (int, long)): # Channel index
-				df = self.data[self._channels[channels]]
-			elif isinstance(channels, list):
-				if isinstance(channels[0], basestring): # List of names
-					df = self.data[channels]
-				elif isinstance(channels[0], (int, long)): # List of indices
-					df = self.data[[self._channels[i] for i in channels]]
-				else:
-					raise TypeError(
-						'Second index must contain channel names or '
-						'positions')
-			elif channels is None:
-				df = self.data
+			elif isinstance(channels[0], (int, long)): # List of indices
+				df = self.data[[self._channels[i] for i in channels]]
 			else:
 				raise TypeError(
-					'Second index must contain channel names or positions')
+					'Second index must contain channel names or '
+					'positions')
+		elif channels is None:
+			df = self.data
+		else:
+			raise TypeError(
+				'Second index must contain channel names or positions')
 
-			# Now index rows
-			if rows is None:
-				return df
-			else:
-				return df.iloc[rows]
+		# Now index rows
+		if rows is None:
+			return df
+		else:
+			return df.iloc[rows]
 
+	def _getitem_rows(self, idx):
 		# Other - assume int, pandas.Series or numpy.ndarray
-		else:
-			return self.data.iloc[idx]
+		return self.data.iloc[idx]
+
+	# __getitem__() handlers for the common exact argument types
+	_getitem_handlers = {
+		str: _getitem_channel,
+		unicode: _getitem_channel,
+		list: _getitem_list,
+		tuple: _getitem_tuple,
+		int: _getitem_rows,
+		slice: _getitem_rows,
+		np.ndarray: _getitem_rows,
+		pd.Series: _getitem_rows,
+		}
 
 	def __contains__(self, item):
 		"""
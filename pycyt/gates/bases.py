@@ -222,9 +222,9 @@ class BooleanGate(SimpleGate):
 
 		# Initialize array with op identity
 		if self._op == 'and':
-			in_composite = np.full(array.shape[0], True, dtype=np.bool)
+			in_composite = np.full(array.shape[0], True, dtype=np.bool_)
 		else:
-			in_composite = np.full(array.shape[0], False, dtype=np.bool)
+			in_composite = np.full(array.shape[0], False, dtype=np.bool_)
 		
 		# Loop through gates
 		for gate, ch_perm in zip(self._gates, self._ch_perm):
@@ -31,6 +31,16 @@ class PolyGate(SimpleGate):
 		# Check if polygon is convex
 		self._is_convex, self._is_rh = math.is_poly_convex(self._vertices)
 
+		# For convex polygon, precompute normal vector and offset of each
+		# side (v1, v2) so that the cross product of the side with the
+		# vector from v1 to a point p is p.dot(normal) - offset
+		if self._is_convex:
+			v1 = np.asarray(self._vertices, dtype=np.float64)
+			dv = np.roll(v1, -1, axis=0) - v1
+			self._side_normals = np.column_stack((dv[:, 1], -dv[:, 0]))
+			self._side_offsets = np.einsum('ij,ij->i', v1,
+				self._side_normals)
+
 		# Compute bounding box
 		self._bbox = [
 			[f(v[i] for v in self._vertices) for f in (min, max)]
@@ -61,30 +71,18 @@ class PolyGate(SimpleGate):
 		# Convex polygon can use faster algorithm
 		if self._is_convex:
 
-			contains = np.full(array.shape[0], True, dtype=np.bool)
-
-			# Loop over pairs of vertices (sides)
-			for v1, v2 in util.cycle_adjacent(self._vertices, 2):
-
-				# Vectors from vertex 1 to all test points
-				dp = array - v1
+			# Cross products of all sides with vectors from their first
+			# vertex to all test points, as a single matrix product
+			cp = array.dot(self._side_normals.T) - self._side_offsets
 
-				# Vector from vertex 1 to vertex 2
-				dv = v2 - v1
-
-				# Cross product between them
-				cp = dp[:,0] * dv[1] - dp[:,1] * dv[0]
-
-				# Reject where cp isn't positive (or negative if left-handed)
-				contains &= (cp > 0) ^ self._is_rh
-
-			return contains
+			# Reject where cp isn't positive (or negative if left-handed)
+			return np.all((cp > 0) ^ self._is_rh, axis=1)
 
 		# Non-convex is slower (there is probably a faster way though)
 		else:
 
 			# Test against bounding box
-			in_box = np.ones(array.shape[0], dtype=np.bool)
+			in_box = np.ones(array.shape[0], dtype=np.bool_)
 			in_box &= array[:,0] > self._bbox[0][0]
 			in_box &= array[:,0] < self._bbox[0][1]
 			in_box &= array[:,1] > self._bbox[1][0]
@@ -103,12 +101,12 @@ class PolyGate(SimpleGate):
 			# passing through a vertex as actually going just above the
 			# vertex, forcing it to be consistently counted one way or
 			# the other.
-			in_p = np.zeros(box_points.shape[0], dtype=np.bool)
+			in_p = np.zeros(box_points.shape[0], dtype=np.bool_)
 
 			# Loop over 3-tuples of vertices (pairs of sides)
 			# Will check the first side each loop but the 2nd is
 			# sometimes needed if the ray intersects at a vertex.
-			for v1, v2, v3 in util.cycle_adjacent(self._vertices, 3):
+			for v1, v2, v3 in util.cycle_adjacent(np.asarray(self._vertices), 3):
 
 				# Indices of points currently looking at
 				ci = np.arange(box_points.shape[0])
@@ -148,6 +146,6 @@ class PolyGate(SimpleGate):
 				which = (v[1] > 0) == (v[0] * t_points[:, 1] > v[1] * t_points[:, 0])
 				in_p[ci[which]] = ~in_p[ci[which]]
 
-			contains = np.zeros(array.shape[0], dtype=np.bool)
+			contains = np.zeros(array.shape[0], dtype=np.bool_)
 			contains[in_box] = in_p
 			return contains
@@ -42,7 +42,7 @@ class RectangleGate(SimpleGate):
 
 	def _inside(self, array):
 
-		contains = np.full(array.shape[0], True, dtype=np.bool)
+		contains = np.full(array.shape[0], True, dtype=np.bool_)
 
 		for col, (bottom, top) in enumerate(self._ranges):
 
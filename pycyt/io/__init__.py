@@ -1,4 +1,4 @@
 """Contains functions for reading data from disk"""
 
-from fcsfile import FCSFile
+from fcsfile import FCSFile, read_fcs_metadata
 from writefcsfile import write_fcs_file
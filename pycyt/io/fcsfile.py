@@ -1,6 +1,12 @@
+from __future__ import division
+
 import sys
 import os
+import re
+import threading
 import warnings
+from collections import defaultdict, OrderedDict
+from multiprocessing.pool import ThreadPool
 
 import pandas as pd
 import numpy as np
@@ -8,6 +14,20 @@ import numpy as np
 from pycyt.errors import FCSReadError
 
 
+# Matches parameter keywords ($PnX), capturing the number and the suffix
+_param_keyword_re = re.compile(r'^\$P(\d+)([A-Z]+)$')
+
+# Optional float-valued parameter keywords, as (suffix, channel info column)
+_float_param_keywords = [(c, '$Pn' + c) for c in ['G', 'O', 'P', 'V']]
+
+# Cache of parsed metadata used by read_fcs_metadata(), by (path,
+# modification time, size). Least recently used entries are dropped once
+# it grows past the maximum size.
+_metadata_cache = OrderedDict()
+_metadata_cache_size = 256
+_metadata_cache_lock = threading.Lock()
+
+
 class FCSFile(object):
 	"""
 	Represents an FCS file on disk
@@ -39,6 +59,8 @@ class FCSFile(object):
 
 	Public methods:
 		read_data: Reads the actual data from the file into a numpy.ndarray.
+		open_many (classmethod): Creates instances for many files at once,
+			reading metadata in parallel.
 	"""
 
 	def __init__(self, path):
@@ -48,6 +70,28 @@ class FCSFile(object):
 
 		self._read_metadata()
 
+	@classmethod
+	def open_many(cls, paths, workers=8):
+		"""
+		Creates instances for many FCS files at once (e.g. all wells of a
+		plate), reading their metadata in a pool of threads. This is mostly
+		waiting on disk I/O, which releases the GIL, so threads are enough
+		to overlap it.
+
+		Args:
+			paths: iterable of str. Paths to FCS files.
+			workers: int. Number of threads to use.
+
+		Returns:
+			list of FCSFile, in the same order as paths.
+		"""
+		pool = ThreadPool(workers)
+		try:
+			return pool.map(cls, paths)
+		finally:
+			pool.close()
+			pool.join()
+
 	@property
 	def filepath(self):
 		return self._path
@@ -80,6 +124,21 @@ class FCSFile(object):
 	def spillover(self):
 		return self._spillover
 
+	@property
+	def _record_dtype(self):
+		"""
+		Numpy composite data type of a single event, with channels as fields.
+		Only depends on metadata so it is created once, but not until needed
+		because it fails if channel names are not unique.
+		"""
+		if self._record_dtype_cached is None:
+			self._record_dtype_cached = np.dtype({
+				'names': list(self._channel_info['$PnN']),
+				'formats': self._channel_dtypes
+				})
+
+		return self._record_dtype_cached
+
 	def read_data(
 			self,
 			slice1=None,
@@ -161,20 +220,22 @@ class FCSFile(object):
 					# correctly
 					data = data.newbyteorder()
 
-			# Compensation
-			if isinstance(comp, np.ndarray):
+			# Compensation (no compensation is the common case, check first)
+			if comp is None or comp is False:
+				pass
+			elif comp is True:
+				if self._comp is None:
+					raise RuntimeError(
+						'Compensation matrix not present in file')
+				data = data.dot(self._comp)
+			elif isinstance(comp, np.ndarray):
 				if comp.ndim != 2 or comp.shape[0] != self._par:
 					raise ValueError(
 						'Compensation matrix must be two-dimensional with '
 						'{0} columns'
 						.format(self._par))
 				data = data.dot(comp)
-			elif comp is True:
-				if self._spillover is None:
-					raise RuntimeError(
-						'Compensation matrix not present in file')
-				data = data.dot(np.linalg.pinv(self._spillover))
-			elif comp is not None and comp is not False:
+			else:
 				raise TypeError(
 					'Comp argument must be bool, numpy.ndarray, or None, not '
 					' {0}'
@@ -209,13 +270,9 @@ class FCSFile(object):
 			# Note that C-order has last axis (channels) chaning fastest
 			data = data.reshape((nevents, self._par), order='C')
 
-			# If integer type, apply masks
-			if self._datatype == 'I':
-				for c in range(self._par):
-					mask = self._int_masks[c]
-					if mask is not None:
-						data[:,c] &= np.asarray([mask],
-							dtype=self._channel_dtypes[c])
+			# If integer type, apply masks to all columns at once
+			if self._int_masks_arr is not None:
+				data &= self._int_masks_arr.astype(dtype)
 
 			return data
 
@@ -240,13 +297,10 @@ class FCSFile(object):
 	def _read_events(self, offset, nevents):
 		"""Reads data in events format (heterogeneous data types)"""
 
-		# Numpy composite data type for each event
-		event_dtype = np.dtype(zip(self.channels, self._channel_dtypes))
-
-		# Read data from file
+		# Read data from file, using composite data type for each event
 		with open(self._path, 'rb') as fh:
 			fh.seek(offset)
-			data = np.fromfile(fh, dtype=event_dtype, count=nevents)
+			data = np.fromfile(fh, dtype=self._record_dtype, count=nevents)
 
 		# Apply integer masks as needed
 		if self._datatype == 'I':
@@ -266,109 +320,12 @@ class FCSFile(object):
 		event data can be read properly.
 		"""
 
-		# Open file
-		with open(self._path, 'rb') as fh:
-
-			# Read in version - first 6 bytes
-			self._version = fh.read(6)
-
-			# Check version
-			if self._version != 'FCS3.1':
-
-				# Warn if older (newer??) FCS version
-				if self._version.startswith('FCS'):
-					warnings.warn(
-						'FCS version of "{0}" is {1}, may be incompatible'
-						.format(self._path, self._version[3:]))
-
-				# Otherwise fail
-				else:
-					raise FCSReadError(
-						'"{0}" does not appear to be a valid FCS file'
-						.format(self._path))
-
-			# Next 4 bytes space, ignore
-			fh.read(4)
-
-			# Read in offsets - integers as 8 right-justified ASCII characters
-			# If offset larger than 99,999,999, should read '       0' and
-			# true offsets will be stored in the TEXT segment (should only
-			# happen with DATA and ANALYSIS segments). I have also seen
-			# '      -1' in the analysis end offset in an FCS3.0 file where
-			# an analysis was not present, so try to support that as well).
-			# Note - Default str to int conversion ignores leading/trailing
-			# whitespace.
-			self._offsets = dict(
-				TEXT=(int(fh.read(8)), int(fh.read(8))),
-				DATA=(int(fh.read(8)), int(fh.read(8))),
-				ANALYSIS=(int(fh.read(8)), int(fh.read(8)))
-				)
-
-			# Read in TEXT segment
-			self._read_text(fh)
-
-			# If the DATA segment extends outside the first 99,999,999 bytes
-			# of the file the offsets cannot be stored in the base allocated
-			# in the header. In this case the standard dictates that the
-			# header contain the strings '       0' instead and that the
-			# actual offsets be given with the $BEGINDATA and $ENDDATA
-			# keywords.
-			if any(o <= 0 for o in self._offsets['DATA']):
-				self._offsets['DATA'] = (
-					int(self._text['$BEGINDATA']),
-					int(self._text['$ENDDATA'])
-					)
-
-			# Handle special values in text
-			self._handle_text()
-
-	def _read_text(self, fh):
-		"""Read in and parse text segment of file given file handle"""
-
-		# Read entire TEXT segment into string
-		text_offset = self._offsets['TEXT']
-		fh.seek(text_offset[0])
-		text = fh.read(text_offset[1] - text_offset[0] + 1)
-
-		# Delimiter character should be at beginning and end of segment
-		delim = text[0]
-		if text[-1] != delim:
-			raise FCSReadError(path=self._path)
-
-		# This shouldn't happen but just in case...
-		if text[1] == delim:
-			raise FCSReadError(path=self._path)
-
-		# Segment formatted as alternating keys and values, separated by
-		# delimiter. But, delimiter can be escaped by writing twice so
-		# can't just use text.split(delim)
-		idx = 1
-		text_segments = []
-		while idx < len(text):
-
-			# Find next index of delimiter which is not immediately
-			# followed by another delimiter
-			next_idx = idx
-			next_idx = text.find(delim, idx)
-			while next_idx < len(text) - 1 and text[next_idx + 1] == delim:
-				next_idx = text.find(delim, next_idx + 2)
+		# Read HEADER and TEXT segments (possibly cached)
+		self._version, self._offsets, self._text = \
+			read_fcs_metadata(self._path)
 
-			# Save segment, after replacing double delimiters
-			segment = text[idx:next_idx].replace(delim * 2, delim)
-			text_segments.append(segment)
-
-			# Skip after next delimiter
-			idx = next_idx + 1
-
-		# Split into keys and values
-		text_keys = text_segments[0::2]
-		text_values = text_segments[1::2]
-
-		if len(text_keys) != len(text_values):
-			raise FCSReadError(path=self._path)
-
-		# Convert to dict
-		self._text = dict(zip(text_keys, text_values))
+		# Handle special values in text
+		self._handle_text()
 
 	def _handle_text(self):
 		"""Parses and validates other important keyword values"""
@@ -418,6 +375,7 @@ class FCSFile(object):
 			self._channel_dtypes = [ordchar + 'f4'] * self._par
 			self._const_type = True
 			self._int_masks = None
+			self._int_masks_arr = None
 
 		# D datatype is 64-bit float as per FCS3.1 spec
 		elif self._datatype == 'D':
@@ -432,6 +390,7 @@ class FCSFile(object):
 			self._channel_dtypes = [ordchar + 'f8'] * self._par
 			self._const_type = True
 			self._int_masks = None
+			self._int_masks_arr = None
 
 		# I datatype is unsigned integer, variable size
 		elif self._datatype == 'I':
@@ -445,38 +404,53 @@ class FCSFile(object):
 					.format(self._path, ', '.join(map(str, supported_bits)))
 					)
 
+			bits = self._channel_info['$PnB'].values
+			ranges = self._channel_info['$PnR'].values
+
 			# Bytes per channel
-			self._channel_bytes = [bits / 8
-				for bits in self._channel_info['$PnB']]
+			self._channel_bytes = (bits // 8).tolist()
 
 			# Numpy dtype string per channel
-			self._channel_dtypes = [ordchar + 'u' + b
+			self._channel_dtypes = ['{0}u{1}'.format(ordchar, b)
 				for b in self._channel_bytes]
 
 			# Check all types are the same
-			self._const_type = all(b == channel_bytes for b in channel_bytes)
-
-			# Caluclate bit masks
-			self._int_masks = []
-			for ch in self._channel_info.iterrows():
-				range_ = ch['$PnR']
-				bits = ch['$PnB']
-				if range_ == (1 << bits):
-					self._int_masks.append(None)
-				else:
-					mask = (1 << (range_ - 1).bit_length()) - 1
-					if mask >= (1 << bits):
-						raise FCSReadError(
-							'Error parsing "{0}": $PnR incompatible with '
-							'$PnB for parameter {1}'
-							.format(self._path, ch['$PnN']))
-					self._int_masks.append(mask)
+			self._const_type = bool(np.all(bits == bits[0]))
+
+			# Caluclate bit masks. The number of bits needed for values up to
+			# $PnR - 1 is its binary exponent (same as int.bit_length()).
+			# Channels which need all of their bits don't need a mask.
+			needed = np.frexp(ranges - 1.)[1]
+			bad = np.flatnonzero(needed > bits)
+			if len(bad):
+				raise FCSReadError(
+					'Error parsing "{0}": $PnR incompatible with '
+					'$PnB for parameter {1}'
+					.format(self._path,
+						self._channel_info['$PnN'].iloc[bad[0]]))
+			self._int_masks = [None if n == b else (1 << n) - 1
+				for n, b in zip(needed.tolist(), bits.tolist())]
+
+			# Masks as an array, to apply to all columns of a matrix at once
+			# (all ones for channels without a mask). Not needed if there
+			# are no masks at all.
+			if any(m is not None for m in self._int_masks):
+				self._int_masks_arr = np.array(
+					[m if m is not None else (1 << 64) - 1
+						for m in self._int_masks],
+					dtype=np.uint64)
+			else:
+				self._int_masks_arr = None
 
 		# Other data types not supported
 		else:
 			raise FCSReadError(
 				'Error parsing "{0}": $DATATYPE="{1}" not supported'
-				.format(self._path, mode))
+				.format(self._path, self._datatype))
+
+		# Numpy composite data type of a single event, created on first use
+		# by the _record_dtype property
+		self._record_dtype_cached = None
 
 		# Read in spillover matrix
 		# $SPILLOVER was introduced in FCS3.1 as an official keyword,
@@ -526,64 +500,264 @@ class FCSFile(object):
 				warnings.warn(
 					'Error parsing spillover matrix in "{0}": {1}: {2}'
 					.format(self._path, type(e).__name__, e))
+				self._spillover = None
 
 		else:
 			self._spillover = None
 
+		# Compensation matrix is the pseudoinverse of the spillover matrix,
+		# only depends on metadata so calculate it once here instead of on
+		# every call to read_data()
+		if self._spillover is not None:
+			self._comp = np.linalg.pinv(self._spillover)
+		else:
+			self._comp = None
+
 	def _create_channels_df(self):
 		"""
 		Creates a pandas.DataFrame describing channel attributes from
 		keywords
 		"""
 
-		# Create empty table
-		self._channel_info = pd.DataFrame.from_items([
-			('$PnN', pd.Series(dtype=str)),    # Short name
-			('$PnB', pd.Series(dtype=int)),    # Bits reserved for parameter
-			('$PnE', pd.Series(dtype=object)), # Amplification type (float, float)
-			('$PnR', pd.Series(dtype=int)),    # Range
-			('$PnD', pd.Series(dtype=object)), # Optional - visualization scale
-			('$PnF', pd.Series(dtype=int)),    # Optional - optical filter
-			('$PnG', pd.Series(dtype=float)),  # Optional - gain
-			('$PnL', pd.Series(dtype=object)), # Optional - exitation wavelengths
-			('$PnO', pd.Series(dtype=float)),  # Optional - excitation power
-			('$PnP', pd.Series(dtype=float)),  # Optional - percent light collected
-			('$PnS', pd.Series(dtype=str)),    # Optional - long name
-			('$PnT', pd.Series(dtype=str)),    # Optional - detector type
-			('$PnV', pd.Series(dtype=float))   # Optional - detector voltage
-			])
-
-		# Fill data frame
+		# Table columns, in order
+		columns = [
+			'$PnN', # Short name
+			'$PnB', # Bits reserved for parameter
+			'$PnE', # Amplification type (float, float)
+			'$PnR', # Range
+			'$PnD', # Optional - visualization scale
+			'$PnF', # Optional - optical filter
+			'$PnG', # Optional - gain
+			'$PnL', # Optional - exitation wavelengths
+			'$PnO', # Optional - excitation power
+			'$PnP', # Optional - percent light collected
+			'$PnS', # Optional - long name
+			'$PnT', # Optional - detector type
+			'$PnV'  # Optional - detector voltage
+			]
+
+		# Group parameter keywords by parameter number in a single pass
+		# over the TEXT segment
+		param_keywords = defaultdict(dict)
+		for keyword, value in self._text.items():
+			match = _param_keyword_re.match(keyword)
+			if match is not None:
+				param_keywords[int(match.group(1))][match.group(2)] = value
+
+		# Collect rows first, then create the data frame in one go (adding
+		# rows to an existing data frame one at a time copies it each time)
+		rows = []
 		for i in range(1, self._par + 1):
 
-			prefix = '$P' + str(i)
+			keywords = param_keywords[i]
 
 			row = dict()
 
 			# Required keywords
-			row['$PnB'] = int(self._text[prefix + 'B'])
-			row['$PnN'] = self._text[prefix + 'N']
-			row['$PnR'] = int(self._text[prefix + 'R'])
+			row['$PnB'] = int(keywords['B'])
+			row['$PnN'] = keywords['N']
+			row['$PnR'] = int(keywords['R'])
 
-			pne = self._text[prefix + 'E']
-			f1, f2 = tuple(pne.split(','))
+			f1, _, f2 = keywords['E'].partition(',')
 			row['$PnE'] = (float(f1), float(f2))
 
 			# Optional keywords
-			row['$PnF'] = self._text.get(prefix + 'F')
-			row['$PnL'] = self._text.get(prefix + 'L', '').split(',')
-			row['$PnS'] = self._text.get(prefix + 'S')
-			row['$PnT'] = self._text.get(prefix + 'T')
-
-			try:
-				pnd = self._text[prefix + 'D']
-				scale, f1, f2 = tuple(pnd.split(','))
+			row['$PnF'] = keywords.get('F')
+			pnl = keywords.get('L')
+			row['$PnL'] = pnl.split(',') if pnl else []
+			row['$PnS'] = keywords.get('S')
+			row['$PnT'] = keywords.get('T')
+
+			pnd = keywords.get('D')
+			if pnd is not None:
+				scale, _, pnd = pnd.partition(',')
+				f1, _, f2 = pnd.partition(',')
 				row['$PnD'] = (scale, float(f1), float(f2))
-			except KeyError:
+			else:
 				row['$PnD'] = None
 
-			for c in ['G', 'O', 'P', 'V']:
-				row['$Pn' + c] = float(self._text.get(prefix + c, 'nan'))
+			for suffix, column in _float_param_keywords:
+				value = keywords.get(suffix)
+				row[column] = float(value) if value is not None else np.nan
+
+			rows.append(row)
+
+		# Create table, indexed by parameter number
+		self._channel_info = pd.DataFrame(rows, columns=columns,
+			index=range(1, self._par + 1))
+
+
+def read_fcs_metadata(path):
+	"""
+	Reads and parses the HEADER and TEXT segments of an FCS file.
+
+	Results are cached by path, modification time, and size of the file, so
+	opening the same unchanged file again (for example when re-running a
+	notebook cell) does not read and parse it again.
+
+	Args:
+		path: str. Path to FCS file.
+
+	Returns:
+		tuple of (version, offsets, text). version is the FCS version from the
+		HEADER segment as str. offsets is a dict with (begin, end) tuples of
+		byte offsets for the "TEXT", "DATA" and "ANALYSIS" segments. text is
+		a dict of keywords and values from the TEXT segment. Both dicts are
+		new copies and may be modified.
+	"""
+	path = os.path.realpath(path)
+	stat = os.stat(path)
+	key = (path, stat.st_mtime, stat.st_size)
+
+	with _metadata_cache_lock:
+		cached = _metadata_cache.pop(key, None)
+
+	if cached is None:
+		cached = _read_metadata(path)
+
+	with _metadata_cache_lock:
+		_metadata_cache[key] = cached
+		while len(_metadata_cache) > _metadata_cache_size:
+			_metadata_cache.popitem(last=False)
+
+	version, offsets, text = cached
+	return version, dict(offsets), dict(text)
+
+
+def _read_metadata(path):
+	"""Reads and parses HEADER and TEXT segments, see read_fcs_metadata()"""
+
+	# Open file. Reads use positional reads on the raw file descriptor,
+	# one system call each and no shared file position.
+	fd = os.open(path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+	try:
+		# Read in the whole fixed-size HEADER segment at once - version
+		# (6 bytes), 4 spaces, then six 8-byte offsets
+		header = _pread(fd, 58, 0)
+		if len(header) != 58:
+			raise FCSReadError(
+				'"{0}" does not appear to be a valid FCS file'
+				.format(path))
+
+		# Check version
+		version = header[0:6]
+		if version != b'FCS3.1':
+
+			# Warn if older (newer??) FCS version
+			if version.startswith(b'FCS'):
+				warnings.warn(
+					'FCS version of "{0}" is {1}, may be incompatible'
+					.format(path, version[3:].decode('ascii')))
 
-			# Add row
-			self._channel_info.loc[i] = row
+			# Otherwise fail
+			else:
+				raise FCSReadError(
+					'"{0}" does not appear to be a valid FCS file'
+					.format(path))
+
+		version = version.decode('ascii')
+
+		# Read in offsets - integers as 8 right-justified ASCII characters
+		# If offset larger than 99,999,999, should read '       0' and
+		# true offsets will be stored in the TEXT segment (should only
+		# happen with DATA and ANALYSIS segments). I have also seen
+		# '      -1' in the analysis end offset in an FCS3.0 file where
+		# an analysis was not present, so try to support that as well).
+		# Note - numpy's string to int conversion ignores leading/trailing
+		# whitespace, like int() does.
+		offsets = np.frombuffer(header, dtype='S8', count=6, offset=10)
+		offsets = offsets.astype(np.int64).tolist()
+		offsets = dict(
+			TEXT=(offsets[0], offsets[1]),
+			DATA=(offsets[2], offsets[3]),
+			ANALYSIS=(offsets[4], offsets[5])
+			)
+
+		# Read entire TEXT segment into string
+		text_offset = offsets['TEXT']
+		if text_offset[1] < text_offset[0]:
+			raise FCSReadError(path=path)
+		text = _pread(fd, text_offset[1] - text_offset[0] + 1, text_offset[0])
+
+	finally:
+		os.close(fd)
+
+	# Parse TEXT segment
+	text = _parse_text(text, path)
+
+	# If the DATA segment extends outside the first 99,999,999 bytes
+	# of the file the offsets cannot be stored in the base allocated
+	# in the header. In this case the standard dictates that the
+	# header contain the strings '       0' instead and that the
+	# actual offsets be given with the $BEGINDATA and $ENDDATA
+	# keywords.
+	if any(o <= 0 for o in offsets['DATA']):
+		offsets['DATA'] = (
+			int(text['$BEGINDATA']),
+			int(text['$ENDDATA'])
+			)
+
+	return version, offsets, text
+
+
+def _parse_text(text, path=None):
+	"""
+	Parses the raw TEXT segment of an FCS file into a dict of keywords and
+	values. Path is only used for error messages.
+	"""
+
+	# Delimiter character should be at beginning and end of segment
+	# (slice instead of index so this also works on Python 3 bytes)
+	delim = text[0:1]
+	if text[-1:] != delim:
+		raise FCSReadError(path=path)
+
+	# This shouldn't happen but just in case...
+	if text[1:2] == delim:
+		raise FCSReadError(path=path)
+
+	# Segment formatted as alternating keys and values, separated by
+	# delimiter. But, delimiter can be escaped by writing twice so
+	# can't just use text.split(delim) by itself - each escaped
+	# delimiter shows up as an empty token between the two halves of the
+	# segment it was in, so join those back together afterwards.
+	# Most files don't escape any delimiters, in which case the split is
+	# all that is needed.
+	body = text[1:-1]
+	if delim * 2 not in body:
+		text_segments = body.split(delim)
+
+	else:
+		parts = body.split(delim)
+		text_segments = []
+		i = 0
+		while i < len(parts):
+			if not parts[i] and text_segments and i + 1 < len(parts):
+				text_segments[-1] += delim + parts[i + 1]
+				i += 2
+			else:
+				text_segments.append(parts[i])
+				i += 1
+
+	# Split into keys and values
+	text_keys = text_segments[0::2]
+	text_values = text_segments[1::2]
+
+	if len(text_keys) != len(text_values):
+		raise FCSReadError(path=path)
+
+	# Convert to dict
+	return dict(zip(text_keys, text_values))
+
+
+def _pread(fd, n, offset):
+	"""
+	Reads n bytes from a file descriptor starting at the given offset,
+	without using the file position. Falls back to seeking and reading
+	where os.pread() is not available (Windows and Python 2).
+	"""
+	if hasattr(os, 'pread'):
+		return os.pread(fd, n, offset)
+	else:
+		os.lseek(fd, offset, os.SEEK_SET)
+		return os.read(fd, n)
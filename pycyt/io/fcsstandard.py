@@ -3,11 +3,12 @@ Contains definitions from the FCS3.1 standard. In particular it enumerates
 the buit-in keywords.
 """
 
+import re
 
 # All FCS keywords defined in 3.1 standard
 # Note that all are uppercase with the exception of a lowercase "n" character
 # which indices an integer value
-fcs_keywords = {
+fcs_keywords = frozenset([
 	'$ABRT',
 	'$BEGINANALYSIS',
 	'$BEGINDATA',
@@ -78,10 +79,10 @@ fcs_keywords = {
 	'$TR',
 	'$VOL',
 	'$WELLID'
-	}
+	])
 
 # Required FCS keywords from 3.1 standard
-fcs_required_keywords = {
+fcs_required_keywords = frozenset([
 	'$BEGINANALYSIS',
 	'$BEGINDATA',
 	'$BEGINSTEXT',
@@ -98,10 +99,10 @@ fcs_required_keywords = {
 	'$PnN',
 	'$PnR',
 	'$TOT'
-	}
+	])
 
 # Parameter keywords from 3.1 standard - "n" stands for the parameter number
-fcs_param_keywords = {
+fcs_param_keywords = frozenset([
 	'$PnB',
 	'$PnCALIBRATION',
 	'$PnD',
@@ -116,7 +117,7 @@ fcs_param_keywords = {
 	'$PnS',
 	'$PnT',
 	'$PnV'
-	}
+	])
 
 # Regexes used to validate keyword values
 _patterns = {
@@ -169,6 +170,17 @@ fcs_keyword_patterns = {
 	'$VOL': _patterns['f']
 	}
 
+# Compiled versions of the above, anchored to match the entire value. The
+# pattern is wrapped in a group so that alternations (like in $BYTEORD) are
+# anchored as a whole.
+fcs_keyword_regexes = dict(
+	(keyword, re.compile('^(?:' + pattern + ')$'))
+	for keyword, pattern in fcs_keyword_patterns.items()
+	)
+
+# Characters which are printable according to the FCS3.1 standard, as bytes
+_printable_chars = bytes(bytearray(range(32, 127)))
+
 
 def is_printable(str_):
 	"""
@@ -181,7 +193,28 @@ def is_printable(str_):
 	Returns:
 		bool
 	"""
-	return all(32 <= ord(c) <= 126 for c in str_)
+	# Encode to bytes and delete all printable characters in a single call,
+	# anything left over is not printable. Non-ASCII characters are never
+	# printable.
+	try:
+		encoded = str_.encode('ascii')
+	except UnicodeError:
+		return False
+	return not encoded.translate(None, _printable_chars)
+
+def all_printable(strings):
+	"""
+	Tests if all strings in a collection contain only printable characters
+	(see is_printable). Checks them all together with a single call instead
+	of one call per string.
+
+	Args:
+		strings: iterable of basestring.
+
+	Returns:
+		bool
+	"""
+	return is_printable(''.join(strings))
 
 def is_valid_delimiter(delim):
 	"""
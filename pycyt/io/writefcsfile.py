@@ -4,29 +4,25 @@ from warnings import warn
 
 import numpy as np
 
-from pycyt.util import FileHandleManager
+from pycyt.util import open_file
 from .fcsstandard import (
 	fcs_keywords,
 	fcs_required_keywords,
 	fcs_param_keywords,
-	fcs_keyword_patterns,
+	fcs_keyword_regexes,
 	is_printable,
+	all_printable,
 	is_valid_keyword,
 	is_valid_delimiter
 	)
 
 
-# Regexes used to validate keyword values
-_patterns = {
-	'n': r'\d+',
-	'f': r'[-+]?(\d*\.\d+|\d+(\.\d*)?)([eE][-+]?\d+)?',
-	'date': r'\d{2}-[A-Za-z]{3}-\d{4}',
-	'time': r'\d{2}:\d{2}:\d{2}(\.\d{2})?'
-	}
+# Digit strings in keywords, replaced with "n" to normalize them
+_digits_re = re.compile(r'\d+')
 
 
 # Keywords that should not be explicitly passed to write_fcs_file()
-_reserved_keywords = [
+_reserved_keywords = frozenset([
 	'$PnN',
 	'$DATATYPE',
 	'$TOT',
@@ -41,7 +37,7 @@ _reserved_keywords = [
 	'$MODE',
 	'$NEXTDATA',
 	'$PnB'
-	]
+	])
 
 
 def estimate_param_range(data):
@@ -75,26 +71,17 @@ def estimate_param_range(data):
 	Returns:
 		int.
 	"""
-	return 2 ** int(round(np.mean(np.log2(np.max(data, axis=0)))))
+	# No events to take the maximum of
+	if data.shape[0] == 0:
+		return 1
 
-
-def get_text_len(text):
-	"""
-	Get number of bytes required to store the TEXT segment of an FCS file.
-
-	Args:
-		text: dict. Keywords as dict keys (str) and values as dict values
-			(unicode). Assumes delimiter has already been escaped in values.
-
-	Returns:
-		int
-	"""
-	# Remember there are two 1-byte delimiters for each key-value pair, plus
-	# one extra delimiter at the beginning (or end)
-	nbytes = 1
-	for keyword, value in text.iteritems():
-		nbytes += 2 + len(keyword) + len(value.encode('UTF-8'))
-	return nbytes
+	# Only one pass over the full data matrix is needed to get the column
+	# maxima, the rest works on the short vector of those. Clamp at 1 so
+	# non-positive columns count as zero bits instead of making the mean
+	# -inf or NaN.
+	maxima = np.maximum(data.max(axis=0), 1)
+	bits = int(round(np.log2(maxima).mean()))
+	return 1 << max(bits, 0)
 
 
 def make_spillover(params, matrix):
@@ -123,10 +110,27 @@ def make_spillover(params, matrix):
 
 	entries = [str(n)]
 	entries.extend(params)
-	entries.extend(str(float(v)) for r in matrix for v in r)
+	entries.extend(map(str, matrix.astype(np.float64).ravel().tolist()))
 	return ','.join(entries)
 
 
+def write_array_chunked(fh, array, chunk_size=1 << 22):
+	"""
+	Writes the raw bytes of an array to a stream, in C order, a fixed-size
+	chunk at a time. Unlike numpy.ndarray.tofile() this works on any
+	writable stream and not just actual files.
+
+	Args:
+		fh: writable stream (file handle, io.BytesIO, etc.).
+		array: numpy.ndarray.
+		chunk_size: int. Number of bytes to write per call. Defaults to
+			4 MiB.
+	"""
+	raw = np.ascontiguousarray(array).reshape(-1).view(np.uint8)
+	for start in range(0, len(raw), chunk_size):
+		fh.write(raw[start:start + chunk_size].data)
+
+
 def write_fcs_file(file_, params, data, text=None, **kwargs):
 	"""
 	Writes data to file in FCS3.1 format.
@@ -191,20 +195,23 @@ def write_fcs_file(file_, params, data, text=None, **kwargs):
 	else:
 		text_dict = dict(text)
 
-	# Validate parameter names
-	seen_params = set()
-	for pname in params:
-		if not is_printable(pname) or ',' in pname:
-			raise ValueError(
-				'Invalid parameter name "{0}" (see docstring)'
-				.format(pname)
-				)
-		if pname in seen_params:
-			raise ValueError(
-				'Parameter name "{0}" occurs more than once'
-				.format(pname)
-				)
-		seen_params.add(pname)
+	# Validate parameter names - check all together, only going through them
+	# one at a time to find the offending name if that fails
+	if (not all_printable(params) or any(',' in p for p in params) or
+			len(set(params)) != len(params)):
+		seen_params = set()
+		for pname in params:
+			if not is_printable(pname) or ',' in pname:
+				raise ValueError(
+					'Invalid parameter name "{0}" (see docstring)'
+					.format(pname)
+					)
+			if pname in seen_params:
+				raise ValueError(
+					'Parameter name "{0}" occurs more than once'
+					.format(pname)
+					)
+			seen_params.add(pname)
 
 	# Validate delimiter
 	if not is_valid_delimiter(delim):
@@ -237,7 +244,7 @@ def write_fcs_file(file_, params, data, text=None, **kwargs):
 		if keyword.startswith('$') and not suppress_warnings:
 
 			# Normalized version of keyword, with digit strings replaced by "n"
-			normkw = re.sub(r'\d+', 'n', keyword)
+			normkw = _digits_re.sub('n', keyword)
 
 			# Check if actually an FCS-defined keyword
 			if normkw in fcs_keywords:
@@ -251,16 +258,13 @@ def write_fcs_file(file_, params, data, text=None, **kwargs):
 						)
 
 				# Validate keyword values
-				try:
-					pattern = '^' + fcs_keyword_patterns[normkw] + '$'
-					if re.match(pattern, value) is None:
-						warn(
-							'Value of FCS-defined keyword "{0}" shoud match'
-							' regex /{1}/'
-							.format(keyword, pattern)
-							)
-				except KeyError:
-					pass
+				regex = fcs_keyword_regexes.get(normkw)
+				if regex is not None and regex.match(value) is None:
+					warn(
+						'Value of FCS-defined keyword "{0}" shoud match'
+						' regex /{1}/'
+						.format(keyword, regex.pattern)
+						)
 
 			# Otherwise it may be a misspelling - warn about it
 			# (it's also forbidden by the standard)
@@ -320,12 +324,26 @@ def write_fcs_file(file_, params, data, text=None, **kwargs):
 		text_dict.setdefault('$P{0}E'.format(i+1), '0,0')
 		text_dict.setdefault('$P{0}R'.format(i+1), str(range_estimate))
 
-	# Convert all keyword values to unicode and escape delimiters
-	for kw in text_dict:
-		text_dict[kw] = unicode(text_dict[kw]).replace(delim, delim + delim)
+	# Encode the TEXT segment as a list of byte strings, to be joined and
+	# written all at once. Values are converted to unicode and have
+	# delimiters escaped in the same pass. Remember where the DATA offset
+	# values are so they can be filled in once the length is known.
+	delim_bytes = delim.encode('ascii')
+	escaped_delim = delim + delim
+	text_parts = [delim_bytes]
+	for keyword, value in text_dict.items():
+		value = unicode(value).replace(delim, escaped_delim)
+		if keyword == '$BEGINDATA':
+			begindata_idx = len(text_parts) + 2
+		elif keyword == '$ENDDATA':
+			enddata_idx = len(text_parts) + 2
+		text_parts.append(keyword.encode('ascii')) # Already validated
+		text_parts.append(delim_bytes)
+		text_parts.append(value.encode('UTF-8'))
+		text_parts.append(delim_bytes)
 
 	# Calculate offests
-	text_bytes = get_text_len(text_dict)
+	text_bytes = sum(len(part) for part in text_parts)
 	offset_text_begin = 256
 	offset_text_end = offset_text_begin + text_bytes - 1
 
@@ -333,7 +351,7 @@ def write_fcs_file(file_, params, data, text=None, **kwargs):
 	offset_data_end = offset_data_begin + data.nbytes - 1
 
 	# Check it all fits...
-	if len(str(offset_text_end)) >= 10 ** 8:
+	if offset_text_end >= 10 ** 8:
 		raise ValueError(
 			'TEXT segment is {0} bytes long, unable fit into first 99,999,999'
 			' bytes'
@@ -346,45 +364,41 @@ def write_fcs_file(file_, params, data, text=None, **kwargs):
 	# LSRFortessa I caught right padding with spaces - read the standard
 	# BD engineers!])
 	offset_format_str = '0{0}d'.format(data_offset_digits)
-	text_dict['$BEGINDATA'] = format(offset_data_begin, offset_format_str)
-	text_dict['$ENDDATA'] = format(offset_data_end, offset_format_str)
+	text_parts[begindata_idx] = \
+		format(offset_data_begin, offset_format_str).encode('ascii')
+	text_parts[enddata_idx] = \
+		format(offset_data_end, offset_format_str).encode('ascii')
+	text_segment = b''.join(text_parts)
+	assert len(text_segment) == text_bytes
+
+	# HEADER segment: FCS standard version identifier, four spaces, then
+	# TEXT, DATA, and ANALYSIS segment offsets left-padded with spaces to 8
+	# bytes. DATA offsets are only given here if they fit (otherwise zero,
+	# they're in the TEXT segment anyways) and ANALYSIS is not supported
+	# (yet) so its offsets are zero too.
+	if offset_data_end < 10 ** 8:
+		header_data_offsets = (offset_data_begin, offset_data_end)
+	else:
+		header_data_offsets = (0, 0)
+	header = ('FCS3.1    %8d%8d%8d%8d%8d%8d' % (
+		(offset_text_begin, offset_text_end) + header_data_offsets + (0, 0)
+		)).encode('ascii')
+	assert len(header) == 58
 
 	# Finally, it's time to start writing
-	with FileHandleManager(file_, mode='wb') as fh:
+	with open_file(file_, mode='wb') as fh:
 		# Just in case we're appending to something maybe?
 		begin_offset = fh.tell()
 
-		# FCS standard version identifier, four spaces
-		fh.write('FCS3.1')
-		fh.write(' ' * 4)
-
-		# TEXT segment offsets, left-padded with spaces to 8 bytes
-		fh.write(format(offset_text_begin, ' 8d'))
-		fh.write(format(offset_text_end, ' 8d'))
-
-		# DATA segment offsets - same, but only if it fits
-		if offset_data_end < 10 ** 8:
-			fh.write(format(offset_data_begin, ' 8d'))
-			fh.write(format(offset_data_end, ' 8d'))
-		else:
-			fh.write(format(0, ' 8d'))
-			fh.write(format(0, ' 8d'))
-
-		# ANALYSYS segment offsets - not supported (yet) so write zeros
-		fh.write(format(0, ' 8d'))
-		fh.write(format(0, ' 8d'))
+		# Write the HEADER segment
+		fh.write(header)
 
 		# Write the TEXT segment
 		fh.seek(offset_text_begin, begin_offset)
-		fh.write(delim)
-		for keyword, value in text_dict.iteritems():
-			fh.write(keyword) # ASCII-encoded (already validated)
-			fh.write(delim)
-			fh.write(value.encode('UTF-8')) # UTF-8 string
-			fh.write(delim)
+		fh.write(text_segment)
 		assert fh.tell() == begin_offset + offset_text_end + 1
 
 		# Finally, write DATA
 		fh.seek(offset_data_begin, begin_offset)
-		data.tofile(fh)
+		write_array_chunked(fh, data)
 		assert fh.tell() == begin_offset + offset_data_end + 1, str(fh.tell())
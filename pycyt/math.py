@@ -1,33 +1,32 @@
 import numpy as np
 
-import util
-
 
 def is_poly_convex(vertices):
 	"""
 	Checks if a polygon is convex and if so, if it is right-handed.
 	"""
 
-	rh = None
-	theta = 0
-
-	for v1, v2, v3 in util.cycle_adjacent(vertices, 3):
+	vertices = np.asarray(vertices, dtype=np.float64)
+	if len(vertices) < 3:
+		return True, None
 
-		d1 = v2 - v1
-		d2 = v3 - v2
+	# Sides of polygon, and the side following each one
+	d1 = np.roll(vertices, -1, axis=0) - vertices
+	d2 = np.roll(d1, -1, axis=0)
 
-		d_theta = np.arctan2(
-			d1[0] * d2[1] - d1[1] * d2[0],
-			d1[0] * d2[0] + d1[1] * d2[1]
-			)
+	# Turning angle at each vertex
+	d_theta = np.arctan2(
+		d1[:, 0] * d2[:, 1] - d1[:, 1] * d2[:, 0],
+		d1[:, 0] * d2[:, 0] + d1[:, 1] * d2[:, 1]
+		)
 
-		if rh is None:
-			rh = d_theta > 0
-		elif (rh and d_theta < 0) or (not rh and d_theta > 0):
-			return False, None
+	# All turns must be in the same direction as the first
+	rh = bool(d_theta[0] > 0)
+	if (rh and np.any(d_theta < 0)) or (not rh and np.any(d_theta > 0)):
+		return False, None
 
-		theta += d_theta
-		if abs(theta) > (np.pi * 2.2):
-			return False, None
+	# And must not wind around more than once
+	if abs(np.sum(d_theta)) > (np.pi * 2.2):
+		return False, None
 
 	return True, rh
@@ -1,7 +1,7 @@
 import os
+import numbers
 
 import numpy as np
-from scipy import ndimage
 import matplotlib as mpl
 from matplotlib import pyplot as plt
 from pkg_resources import resource_filename
@@ -28,13 +28,15 @@ class ScaleMapper(object):
 			(from_range[1] - from_range[0])
 
 	def __call__(self, x):
-		if hasattr(x, '__iter__'):
-			return [self(e) for e in x if self.in_domain(e)]
+		if np.isscalar(x):
+			return (x - self.from_bottom) * self.scale + self.to_bottom
 		else:
+			x = np.asarray(x, dtype=np.float64)
+			x = x[self.in_domain(x)]
 			return (x - self.from_bottom) * self.scale + self.to_bottom
 
 	def in_domain(self, x):
-		return self.from_range[0] <= x <= self.from_range[1]
+		return (x >= self.from_range[0]) & (x <= self.from_range[1])
 
 
 def format_axis_label(lab, transform=None):
@@ -68,15 +70,66 @@ def plot_comp_matrix(matrix, channels, ax=None):
 	plt.colorbar(im)
 
 
+def _uniform_histogram2d(x, y, bounds, bins):
+	"""
+	Same as np.histogram2d(x, y, range=bounds, bins=bins) for an integer
+	number of bins, but computes bin indices directly and counts them with
+	a single np.bincount instead of searching bin edges.
+	"""
+	(x0, x1), (y0, y1) = bounds
+
+	# Only points in range, right edge is inclusive like histogram2d
+	keep = (x >= x0) & (x <= x1) & (y >= y0) & (y <= y1)
+
+	ix = ((x[keep] - x0) * (bins / float(x1 - x0))).astype(np.intp)
+	iy = ((y[keep] - y0) * (bins / float(y1 - y0))).astype(np.intp)
+
+	# Points on the right edge go in the last bin
+	np.minimum(ix, bins - 1, out=ix)
+	np.minimum(iy, bins - 1, out=iy)
+
+	counts = np.bincount(ix * bins + iy, minlength=bins * bins)
+	hist = counts.reshape((bins, bins)).astype(np.float64)
+
+	xedges = np.linspace(x0, x1, bins + 1)
+	yedges = np.linspace(y0, y1, bins + 1)
+
+	return hist, xedges, yedges
+
+
 def bin2d(data, transform=None, range=None, bins=256):
 
-	if transform is not None:
-		array = apply_transform(data, transform, drop=True, asarray=True)
+	# Data may also be given as an (x, y) tuple of separate 1D columns
+	if isinstance(data, tuple) and transform is None:
+		x, y = data
+
 	else:
-		array = TableInterface(data, 2).data
+		if isinstance(data, tuple):
+			data = np.column_stack(data)
+
+		if transform is not None:
+			array = apply_transform(data, transform, drop=True, asarray=True)
+		else:
+			array = TableInterface(data, 2).data
 
-	x = array[:,0]
-	y = array[:,1]
+		x = array[:,0]
+		y = array[:,1]
+
+	# Contiguous copies of each column, since several passes are made over
+	# them and strided reads of the (n, 2) array waste half of each cache line
+	x = np.ascontiguousarray(x)
+	y = np.ascontiguousarray(y)
+
+	# Uniform bins over a non-empty range can be counted directly. With no
+	# range given, histogram2d would use the data limits, so do the same.
+	if isinstance(bins, numbers.Integral):
+		if range is None and len(x) > 0:
+			bounds = [[x.min(), x.max()], [y.min(), y.max()]]
+		else:
+			bounds = range
+		if (bounds is not None and bounds[0][1] > bounds[0][0] and
+				bounds[1][1] > bounds[1][0]):
+			return _uniform_histogram2d(x, y, bounds, bins)
 
 	return np.histogram2d(x, y, range=range, bins=bins)
 
@@ -92,9 +145,13 @@ def density2d(
 	if ax is None:
 		ax = plt.gca()
 
+	labels = None
 	if 'labels' not in kwargs:
-		table = TableInterface(data, 2)
-		if table.column_names is not None:
+		if isinstance(data, tuple):
+			table = None
+		else:
+			table = TableInterface(data, 2)
+		if table is not None and table.column_names is not None:
 			transforms = parse_transforms_list(transform, 2)
 			labels = [format_axis_label(c, t) for c, t
 				in zip(table.column_names, transforms)]
@@ -105,13 +162,22 @@ def density2d(
 
 	cutoff = kwargs.pop('cutoff', 99.5)
 	if cutoff is not None:
-		top = np.percentile(hist, cutoff)
-		hist[hist > top] = top
-
+		# Percentile (rounding down to an actual bin value) by partial sort,
+		# then clip in place
+		flat = hist.ravel()
+		k = int(cutoff / 100. * (flat.size - 1))
+		top = np.partition(flat, k)[k]
+		np.minimum(hist, top, out=hist)
+
+	# Empty bins should be left blank. imshow treats NaN and inf as invalid,
+	# so no masked array is needed: with log they come out as -inf in the
+	# same pass, otherwise set them to NaN.
 	if kwargs.pop('log', False):
-		img_hist = np.ma.array(np.log(hist), mask=(hist==0)).transpose()
+		with np.errstate(divide='ignore'):
+			np.log(hist, out=hist)
 	else:
-		img_hist = np.ma.array(hist, mask=(hist==0)).transpose()
+		hist[hist == 0] = np.nan
+	img_hist = hist.transpose()
 
 	extent = [xedges[0], xedges[-1], yedges[0], yedges[-1]]
 
@@ -136,7 +202,7 @@ def hist(data, *args, **kwargs):
 		column = None
 	elif len(args) ==2:
 		column, transform = args
-		data = TableInterface(data, [column]).data.flatten()
+		data = TableInterface(data, [column]).data.ravel()
 	elif len(args) == 0:
 		transform = None
 		column = None
@@ -194,16 +260,28 @@ def matrix(data, transform=None, figure=None):
 	# Apply transforms, get points in range but don't drop yet
 	transforms = parse_transforms_list(transform, table.ncol)
 	tarray = apply_transform(array, transform, drop=False, asarray=True)
-	in_domain = np.ones((table.nrow, table.ncol), dtype=np.bool)
-	for col, t in enumerate(transforms):
-		if t is not None:
-			in_domain[:,col] = t.array_in_domain(array[:,col])
+	in_domain = np.ones((table.nrow, table.ncol), dtype=np.bool_, order='F')
 
-	# Get limits for axes
-	lim = []
-	for col in range(table.ncol):
-		coldata = tarray[in_domain[:, col], col]
-		lim.append([np.min(coldata), np.max(coldata)])
+	# Check domain once for all columns sharing the same transform object
+	# (array_in_domain is elementwise, so works on 2D slices)
+	transform_cols = dict()
+	for col, t in enumerate(transforms):
+		if t is not None and not t.unrestricted_domain:
+			transform_cols.setdefault(id(t), (t, []))[1].append(col)
+	for t, cols in transform_cols.values():
+		in_domain[:, cols] = t.array_in_domain(array[:, cols])
+
+	# Contiguous transformed columns, and values in domain for each
+	tcols = [np.ascontiguousarray(tarray[:, col])
+		for col in range(table.ncol)]
+	coldata = [tcols[col][in_domain[:, col]] for col in range(table.ncol)]
+
+	# Get limits for axes, reducing over all columns at once with values out
+	# of domain replaced by NaN
+	masked = np.where(in_domain, tarray, np.nan)
+	lim = np.column_stack((np.nanmin(masked, axis=0),
+		np.nanmax(masked, axis=0))).tolist()
+	del masked
 
 	# Loop over positions in matrix
 	subplots = np.ndarray((table.ncol, table.ncol), dtype=object)
@@ -218,16 +296,17 @@ def matrix(data, transform=None, figure=None):
 			# Histogram
 			if xcol == ycol:
 
-				hist(tarray[in_domain[:, xcol], xcol], ax=sp, xlab=None,
-					ylab=None, range=lim[xcol])
+				hist(coldata[xcol], ax=sp, xlab=None, ylab=None,
+					range=lim[xcol])
 				sp.xlim = lim[xcol]
 
 			# Density plot
 			else:
 
-				rows = np.all(in_domain[:, [xcol, ycol]], axis=1)
-				density2d(tarray[:, [xcol, ycol]][rows, :], ax=sp,
-					range=[lim[xcol], lim[ycol]], labels=None)
+				rows = in_domain[:, xcol] & in_domain[:, ycol]
+				points = (tcols[xcol][rows], tcols[ycol][rows])
+				density2d(points, ax=sp, range=[lim[xcol], lim[ycol]],
+					labels=None)
 				sp.xlim = lim[xcol]
 				sp.ylim = lim[ycol]
 
@@ -260,12 +339,42 @@ def matrix(data, transform=None, figure=None):
 	return figure
 
 
+# Colormaps created by transparency_cmap(), by RGBA color and by the color
+# argument as passed (if hashable)
+_transparency_cmaps = dict()
+_transparency_cmaps_max = 64
+
 def transparency_cmap(color):
+	"""
+	Two-color colormap going from fully transparent to the given color.
+	Colormaps are cached and shared between calls with the same color, so
+	don't modify the one returned (e.g. with set_bad()) - copy it first.
+	"""
+
+	# Check argument as given first to skip color conversion
+	try:
+		return _transparency_cmaps[color]
+	except (KeyError, TypeError):
+		pass
+
+	rgba = tuple(mpl.colors.colorConverter.to_rgba(color))
+
+	cmap = _transparency_cmaps.get(rgba)
+	if cmap is None:
+		transparent = rgba[:3] + (0,)
+		cmap = mpl.colors.ListedColormap([transparent, rgba])
+
+	# Each color may add two entries, clear before going over the limit
+	if len(_transparency_cmaps) >= _transparency_cmaps_max - 1:
+		_transparency_cmaps.clear()
+	_transparency_cmaps[rgba] = cmap
 
-	color = mpl.colors.colorConverter.to_rgba(color)
-	transparent = list(color)[:3] + [0]
+	try:
+		_transparency_cmaps[color] = cmap
+	except TypeError:
+		pass
 
-	return mpl.colors.ListedColormap([transparent, color])
+	return cmap
 
 def auto_gate_range(gate, transform=None):
 
@@ -326,7 +435,16 @@ def gate_edges(gate, range=None, bins=256, transform=None):
 
 	img = gate_img(gate, range, bins=bins, transform=transform)
 
-	edges = ndimage.sobel(img, 0) | ndimage.sobel(img, 1)
+	# Edge pixels are those in the gate which have a neighbor (up, down,
+	# left, or right) outside of it - don't count pixels on the border of the
+	# image. Just OR together shifted copies of the outside mask.
+	outside = ~img
+	edges = np.zeros_like(img)
+	edges[1:, :] |= outside[:-1, :]
+	edges[:-1, :] |= outside[1:, :]
+	edges[:, 1:] |= outside[:, :-1]
+	edges[:, :-1] |= outside[:, 1:]
+	edges &= img
 
 	return edges
 
@@ -336,9 +454,15 @@ def gate_img(gate, range=None, bins=256, transform=None):
 	if range is None:
 		range = auto_gate_range(gate, transform)
 
-	x, y = np.meshgrid(np.linspace(*range[0], num=bins), np.linspace(*range[1], num=bins))
+	xs = np.linspace(*range[0], num=bins)
+	ys = np.linspace(*range[1], num=bins)
 
-	points = np.vstack((x.flatten(), y.flatten())).transpose()
+	# Grid points in image order (x changing fastest), filled in directly by
+	# broadcasting into a (y, x, coordinate) view of the buffer
+	points = np.empty((bins * bins, 2), dtype=xs.dtype)
+	grid = points.reshape((bins, bins, 2))
+	grid[:, :, 0] = xs
+	grid[:, :, 1] = ys[:, np.newaxis]
 	points = apply_transform(points, transform, inverse=True, drop=True,
 		asarray=True)
 
@@ -22,21 +22,49 @@ def by_name(name, **kwargs):
 		raise KeyError('No registered transform {0}'.format(name))
 
 
+# Transforms created by parse_transform_arg() from names and (name, kwargs)
+# tuples, keyed by name and kwargs items. Transforms are immutable so the
+# same instance can be handed out each time.
+_parsed_transforms = dict()
+_parsed_transforms_max = 256
+
+
+def _cached_by_name(name, kwargs):
+	"""
+	Same as by_name(name, **kwargs), but reuses previously created instances.
+	"""
+	try:
+		key = (name, frozenset(kwargs.items()))
+		transform = _parsed_transforms.get(key)
+	except TypeError:
+		# Unhashable kwarg values, can't cache
+		return by_name(name, **kwargs)
+
+	if transform is None:
+		transform = by_name(name, **kwargs)
+		if len(_parsed_transforms) >= _parsed_transforms_max:
+			_parsed_transforms.clear()
+		_parsed_transforms[key] = transform
+
+	return transform
+
+
 def parse_transform_arg(arg):
 	"""
 	Parses a transformation argument in one of several different formats and
 	returns an instance of a subclass of AbstractTransform. Can be an actual
 	instance of AbstractTransform, in which case it is returned unchanged,
 	a name of a registered transform, or a 2-tuple consisting of a name and
-	dict of kwargs for transform constructor.
+	dict of kwargs for transform constructor. Transforms created from names
+	or tuples are cached, so equal arguments give the same instance.
 	"""
 	if isinstance(arg, AbstractTransform):
 		return arg
 	elif isinstance(arg, basestring):
-		return by_name(arg)
+		return _cached_by_name(arg, {})
 	elif isinstance(arg, tuple):
 		name, kwargs = arg
-		return by_name(name, **kwargs)
+		return _cached_by_name(name, kwargs)
 	elif arg is None:
 		return None
 	else:
@@ -100,27 +128,51 @@ def transform(data, *args, **kwargs):
 				'in data'
 				)
 
-		# Parse arguments to transform objects
-		transforms = map(parse_transform_arg, targ)
+		# Parse arguments to transform objects, grouping together columns
+		# that share the same one (equal arguments give the same object) so
+		# it can be applied to all of them at once
+		groups = []
+		group_index = dict()
+		for c, arg in enumerate(targ):
+			transform = parse_transform_arg(arg)
+			if transform is None:
+				continue
+			if id(transform) in group_index:
+				groups[group_index[id(transform)]][1].append(c)
+			else:
+				group_index[id(transform)] = len(groups)
+				groups.append((transform, [c]))
 
 		# Invert if needed
 		if inverse:
-			transforms = [t.inverse if t is not None else None
-				for t in transforms]
+			groups = [(t.inverse, cols) for t, cols in groups]
 
-		# Drop rows not within domain of transformation
+		# Drop rows not within domain of transformation (only need to check
+		# columns with restricted domains)
 		if drop:
-			in_domain = np.full(table.nrow, True, dtype=np.bool)
-			for c, transform in enumerate(transforms):
-				if transform is not None:
-					in_domain &= transform.array_in_domain(array[:, c])
-			array = array[in_domain, :]
-
-		# Perform transformations
-		transformed = array.copy()
-		for c, transform in enumerate(transforms):
-			if transform is not None:
-				transformed[:, c] = transform.apply_array(array[:, c])
+			in_domain = None
+			for transform, cols in groups:
+				if not transform.unrestricted_domain:
+					mask = np.all(transform.array_in_domain(array[:, cols]),
+						axis=1)
+					if in_domain is None:
+						in_domain = mask
+					else:
+						in_domain &= mask
+			if in_domain is not None:
+				array = array[in_domain, :]
+
+		# Perform transformations, with a single apply_array() call on the
+		# block of columns for each transform (they all work elementwise).
+		# Only copy over untransformed columns.
+		transformed = np.empty_like(array)
+		transformed_cols = set(c for t, cols in groups for c in cols)
+		untransformed_cols = [c for c in range(table.ncol)
+			if c not in transformed_cols]
+		if untransformed_cols:
+			transformed[:, untransformed_cols] = array[:, untransformed_cols]
+		for transform, cols in groups:
+			transformed[:, cols] = transform.apply_array(array[:, cols])
 
 	# Else transform the whole array at once
 	else:
@@ -131,7 +183,9 @@ def transform(data, *args, **kwargs):
 			transform = transform.inverse
 
 		# Drop rows
-		if drop:
+		if drop and transform.unrestricted_domain:
+			in_domain = None
+		elif drop:
 			in_domain = np.all(transform.array_in_domain(array), axis=1)
 			array = array[in_domain, :]
 
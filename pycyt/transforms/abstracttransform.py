@@ -1,9 +1,64 @@
 import numpy as np
+from numpy.lib.stride_tricks import as_strided
 
 from pycyt.util import AutoIDMixin, AutoIDMeta
 from pycyt.data import TableInterface
 
 
+# Single True value all_true_mask() views are made from
+_true = np.ones(1, dtype=np.bool_)
+
+
+def all_true_mask(array):
+	"""
+	Gets an all-True boolean mask with the same shape as an array, for use as
+	the return value of array_in_domain() by transforms whose domain is all
+	real numbers. This is a read-only view of a single value, so no memory is
+	allocated for it regardless of the size of the array.
+
+	Args:
+		array: numpy.ndarray.
+
+	Returns:
+		numpy.ndarray. Read-only, bool dtype.
+	"""
+	mask = as_strided(_true, shape=array.shape, strides=(0,) * array.ndim)
+	mask.flags.writeable = False
+	return mask
+
+
+def float_dtype(array):
+	"""
+	Gets the dtype to compute transformed values of an array in. Floating
+	point arrays keep their dtype (so single precision data is transformed in
+	single precision), anything else gets float64.
+
+	Args:
+		array: numpy.ndarray.
+
+	Returns:
+		numpy.dtype.
+	"""
+	if array.dtype.kind == 'f':
+		return array.dtype
+	else:
+		return np.dtype(np.float64)
+
+
+def empty_float_like(array):
+	"""
+	Gets an uninitialized array to write transformed values to, with the same
+	shape as an input array and dtype given by float_dtype().
+
+	Args:
+		array: numpy.ndarray.
+
+	Returns:
+		numpy.ndarray.
+	"""
+	return np.empty(array.shape, dtype=float_dtype(array))
+
+
 class AbstractTransformMeta(AutoIDMeta):
 
 	def __init__(cls, name, bases, dct):
@@ -36,12 +91,18 @@ class AbstractTransform(AutoIDMixin):
 
 	__metaclass__ = AbstractTransformMeta
 
+	# Set to True in subclasses whose domain is all real numbers, so callers
+	# can skip calling array_in_domain() and dropping rows altogether
+	unrestricted_domain = False
+
 	def __call__(self, x, drop=False):
 
 		if np.isscalar(x):
-			return self.apply_array(np.asarray(x))[()]
+			return self.apply_scalar(x)
 
-		elif isinstance(x, np.ndarray) and not drop:
+		# Arrays can be transformed directly if nothing would be dropped
+		elif isinstance(x, np.ndarray) and (
+				not drop or self.unrestricted_domain):
 			return self.apply_array(x)
 
 		else:
@@ -51,7 +112,9 @@ class AbstractTransform(AutoIDMixin):
 			array = table.data
 
 			# Drop rows which are not in domain if needed
-			if drop:
+			if drop and self.unrestricted_domain:
+				in_domain = None
+			elif drop:
 				in_domain = np.all(self.array_in_domain(array), axis=1)
 				array = array[in_domain]
 
@@ -96,5 +159,10 @@ class AbstractTransform(AutoIDMixin):
 	def apply_array(self, array):
 		raise NotImplementedError()
 
+	def apply_scalar(self, x):
+		# Subclasses may override with plain Python math, which is much faster
+		# for single values than going through numpy
+		return self.apply_array(np.asarray(x))[()]
+
 	def array_in_domain(self, array):
 		raise NotImplementedError()
@@ -1,10 +1,14 @@
+import math
+
 import numpy as np
 
-from abstracttransform import AbstractTransform
+from abstracttransform import AbstractTransform, all_true_mask
 
 
 class AsinhTransform(AbstractTransform):
 
+	unrestricted_domain = True
+
 	__transform_names__ = ['asinh', 'fasinh']
 
 	def __init__(self, b=10, t=1, pd=4, nd=0):
@@ -13,9 +17,10 @@ class AsinhTransform(AbstractTransform):
 		self._pos_decades = pd
 		self._neg_decades = nd
 
-		self._p1 = np.sinh(pd * np.log(b)) / t
-		self._p2 = nd * np.log(b)
-		self._p3 = 1. / ((pd + nd) * np.log(b))
+		# Scalar constants, math module is faster than numpy for these
+		self._p1 = math.sinh(pd * math.log(b)) / t
+		self._p2 = nd * math.log(b)
+		self._p3 = 1. / ((pd + nd) * math.log(b))
 
 	@property
 	def base(self):
@@ -47,23 +52,33 @@ class AsinhTransform(AbstractTransform):
 		return 'fasinh'
 
 	def apply_array(self, array):
-		return (np.arcsinh(array * self._p1) + self._p2) * self._p3
+		# Single temporary, updated in place
+		out = np.multiply(array, self._p1)
+		np.arcsinh(out, out=out)
+		out += self._p2
+		out *= self._p3
+		return out
+
+	def apply_scalar(self, x):
+		return (math.asinh(x * self._p1) + self._p2) * self._p3
 
 	def array_in_domain(self, array):
-		return np.ones_like(array, dtype=np.bool)
+		return all_true_mask(array)
 
 
 class SinhTransform(AbstractTransform):
 
+	unrestricted_domain = True
+
 	def __init__(self, b=10, t=1, pd=4, nd=0):
 		self._base = b
 		self._top = t
 		self._pos_decades = pd
 		self._neg_decades = nd
 
-		self._ip1 = t / np.sinh(pd * np.log(b))
-		self._p2 = nd * np.log(b)
-		self._ip3 = (pd + nd) * np.log(b)
+		self._ip1 = t / math.sinh(pd * math.log(b))
+		self._p2 = nd * math.log(b)
+		self._ip3 = (pd + nd) * math.log(b)
 
 	@property
 	def base(self):
@@ -91,7 +106,18 @@ class SinhTransform(AbstractTransform):
 		return AsinhTransform(**self.kwargs)
 
 	def apply_array(self, array):
-		return np.sinh(array * self._ip3 - self._p2) * self._ip1
+		out = np.multiply(array, self._ip3)
+		out -= self._p2
+		np.sinh(out, out=out)
+		out *= self._ip1
+		return out
+
+	def apply_scalar(self, x):
+		try:
+			return math.sinh(x * self._ip3 - self._p2) * self._ip1
+		except OverflowError:
+			# numpy gives +/- inf
+			return AbstractTransform.apply_scalar(self, x)
 
 	def array_in_domain(self, array):
-		return np.ones_like(array, dtype=np.bool)
+		return all_true_mask(array)
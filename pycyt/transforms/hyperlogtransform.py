@@ -1,11 +1,15 @@
+import math
+
 import numpy as np
-from scipy.special import lambertw
 
-from abstracttransform import AbstractTransform
+from abstracttransform import (AbstractTransform, all_true_mask,
+	empty_float_like)
 
 
 class InverseHyperlogTransform(AbstractTransform):
 
+	unrestricted_domain = True
+
 	def __init__(self, b=10, t=1, pd=4, ld=1, nd=0):
 		self._base = b
 		self._top = t
@@ -28,17 +32,17 @@ class InverseHyperlogTransform(AbstractTransform):
 		x1 = x2 + w
 		x0 = x2 + 2 * w
 
-		self._b = (pd + nd) * np.log(b)
+		self._b = (pd + nd) * math.log(b)
 
-		e0 = np.exp(self._b * x0)
+		e0 = math.exp(self._b * x0)
 		c_a = e0 / w
-		f_a = np.exp(self._b * x1) + c_a * x1
-		self._a = t / (np.exp(self._b) + c_a - f_a)
+		f_a = math.exp(self._b * x1) + c_a * x1
+		self._a = t / (math.exp(self._b) + c_a - f_a)
 		self._c = c_a * self._a
 		self._f = f_a * self._a
 
 		# Make sure we ended up with real-values parameters
-		param_ok = lambda v: not np.isnan(v) and np.isfinite(v)
+		param_ok = lambda v: not math.isnan(v) and not math.isinf(v)
 		assert all(param_ok(getattr(self, '_' + n)) for n in 'abcf')
 
 	@property
@@ -71,19 +75,42 @@ class InverseHyperlogTransform(AbstractTransform):
 		return LogicleTransform(**self.kwargs)
 
 	def apply_array(self, array):
-		return self._a * np.exp(self._b * array) \
-			+ self._c * array \
-			- self._f
+		return self.apply_array_out(array, empty_float_like(array),
+			empty_float_like(array))
+
+	def apply_array_out(self, array, out, scratch):
+		"""
+		Same as apply_array() but writes into preallocated arrays instead of
+		creating temporaries.
+
+		Args:
+			array: numpy.ndarray. Values to transform.
+			out: numpy.ndarray. Float array of same shape to write result to.
+			scratch: numpy.ndarray. Float array of same shape, is left
+				containing the exponential term a * exp(b * array).
+
+		Returns:
+			numpy.ndarray. out.
+		"""
+		np.multiply(array, self._b, out=scratch)
+		np.exp(scratch, out=scratch)
+		scratch *= self._a
+		np.multiply(array, self._c, out=out)
+		out += scratch
+		out -= self._f
+		return out
 
 	def array_in_domain(self, array):
-		return np.ones_like(array, dtype=np.bool)
+		return all_true_mask(array)
 
 
 class HyperlogTransform(AbstractTransform):
 
+	unrestricted_domain = True
+
 	__transform_names__ = ['hyperlog']
 
-	def __init__(self, b=10, t=1, pd=4, ld=1, nd=0, niter=10):
+	def __init__(self, b=10, t=1, pd=4, ld=1, nd=0, niter=10, xtol=1e-9):
 		self._base = b
 		self._top = t
 		self._pos_decades = pd
@@ -92,8 +119,17 @@ class HyperlogTransform(AbstractTransform):
 
 		self._niter = niter
 
+		# Newton step size (in transformed units) at which to stop iterating
+		self._xtol = xtol
+
 		self._inverse = InverseHyperlogTransform(b=b, t=t, pd=pd, ld=ld, nd=nd)
 
+		# Values of the inverse at +/- w (in transformed units), used to
+		# divide data into regions for initial guesses in apply_array()
+		w = .2
+		self._thresh_p = float(self._inverse(w))
+		self._thresh_n = float(self._inverse(-w))
+
 	@property
 	def base(self):
 		return self._base
@@ -131,14 +167,15 @@ class HyperlogTransform(AbstractTransform):
 		# Grab the hidden parameters from the biexponential transform
 		a, b, c, f = tuple(getattr(self._inverse, '_' + n) for n in 'abcf')
 
-		# Get an inital guess
-		x = np.zeros_like(array, dtype=np.float64)
+		# Get an inital guess, single precision input is computed in single
+		# precision
+		x = empty_float_like(array)
+		x.fill(0)
 
 		# Divide data into 3 regions, those where the value of the function
 		# will be greater than, less than, or close to zero.
-		w = .2
-		r_p = np.logical_and(array > self._inverse(w), array > -f)
-		r_n = array < self._inverse(-w)
+		r_p = np.logical_and(array > self._thresh_p, array > -f)
+		r_n = array < self._thresh_n
 
 		# Generate guesses by assuming one or both of the exponential
 		# terms in the inverse to be close to 0 and inverting the
@@ -146,16 +183,41 @@ class HyperlogTransform(AbstractTransform):
 		x[r_p] = np.log((array[r_p] + f) / a) / b
 		x[r_n] = (array[r_n] + f - 1) / c
 
-		# Now, apply Newton's method to iteratively improve the guess
+		# Now, apply Newton's method to iteratively improve the guess. The
+		# exponential term is shared between the function value and its
+		# derivative so only compute it once per iteration, and intermediate
+		# values are written into buffers allocated once up front.
 		tol = 1e-9
-		for i in range(self._niter):
-			y = self._inverse(x) - array
-			dy = a * b * np.exp(b * x) + c
 
-			t = np.abs(dy) > tol
-			x[t] -= (y / dy)[t]
+		# Steps can't get much smaller than the precision of the data type
+		step_tol = max(self._xtol, 4 * np.finfo(x.dtype).eps)
+		ae = np.empty_like(x)
+		y = np.empty_like(x)
+		dy = np.empty_like(x)
+		step = np.empty_like(x)
+		t = np.empty(x.shape, dtype=np.bool_)
+		for i in range(self._niter):
+			# y = a * exp(b * x) + c * x - f - array, leaves exponential
+			# term in ae
+			self._inverse.apply_array_out(x, y, ae)
+			y -= array
+
+			# dy = a * b * exp(b * x) + c
+			np.multiply(ae, b, out=dy)
+			dy += c
+
+			# Only update where derivative is not too close to zero
+			np.greater(np.abs(dy, out=step), tol, out=t)
+			step.fill(0)
+			np.divide(y, dy, out=step, where=t)
+			x -= step
+
+			# Convergence is quadratic, so stop early once every step is
+			# within tolerance
+			if step.size == 0 or np.abs(step, out=step).max() < step_tol:
+				break
 
 		return x
 
 	def array_in_domain(self, array):
-		return np.ones_like(array, dtype=np.bool)
+		return all_true_mask(array)
@@ -1,10 +1,12 @@
 import numpy as np
 
-from abstracttransform import AbstractTransform
+from abstracttransform import AbstractTransform, all_true_mask
 
 
 class LinearTransform(AbstractTransform):
 
+	unrestricted_domain = True
+
 	__transform_names__ = ['lin', 'flin']
 
 	def __init__(self, b=0, t=1, tb=0, tt=1):
@@ -47,5 +49,8 @@ class LinearTransform(AbstractTransform):
 	def apply_array(self, array):
 		return (array - self._bottom) * self._scale + self._to_bottom
 
+	def apply_scalar(self, x):
+		return (x - self._bottom) * self._scale + self._to_bottom
+
 	def array_in_domain(self, array):
-		return np.ones_like(array, dtype=np.bool)
+		return all_true_mask(array)
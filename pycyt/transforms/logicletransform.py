@@ -1,11 +1,82 @@
+import math
+
 import numpy as np
-from scipy.special import lambertw
 
-from abstracttransform import AbstractTransform
+from abstracttransform import (AbstractTransform, all_true_mask,
+	float_dtype, empty_float_like)
+
+
+def _lambertw(z, tol=1e-15, maxiter=50):
+	"""
+	Principal branch of the Lambert W function (solution w of w*exp(w) = z)
+	for real z >= 0, by Halley's method. Only needed here for a single scalar
+	so this is much cheaper than the general complex version in scipy.
+
+	Args:
+		z: float. Must be non-negative.
+
+	Returns:
+		float.
+	"""
+	if z < 0:
+		raise ValueError('z must be non-negative')
+	if z == 0:
+		return 0.
+
+	# Initial guess, asymptotic expansion for large z
+	if z < math.e:
+		w = math.log1p(z)
+	else:
+		lz = math.log(z)
+		w = lz - math.log(lz)
+
+	for i in range(maxiter):
+		ew = math.exp(w)
+		f = w * ew - z
+		dw = f / (ew * (w + 1) - (w + 2) * f / (2 * w + 2))
+		w -= dw
+		if abs(dw) <= tol * (1 + abs(w)):
+			break
+
+	return w
+
+
+# Cache of solved d parameters, keyed by (b, w) as calculated in
+# BiexponentialTransform.__init__()
+_solved_d = dict()
+_solved_d_max = 128
+
+
+def _solve_d(b, w):
+	"""
+	Solves for the d parameter of the biexponential function given b and w,
+	reusing the result for parameter sets that have been seen before.
+
+	Args:
+		b: float.
+		w: float.
+
+	Returns:
+		float.
+	"""
+	key = (b, w)
+	d = _solved_d.get(key)
+
+	if d is None:
+		y = 2. * math.log(b) - w * b
+		d = 2. / w * _lambertw(.5 * w * math.exp(.5 * y))
+
+		if len(_solved_d) >= _solved_d_max:
+			_solved_d.clear()
+		_solved_d[key] = d
+
+	return d
 
 
 class BiexponentialTransform(AbstractTransform):
 
+	unrestricted_domain = True
+
 	def __init__(self, b=10, t=1, pd=4, ld=1, nd=0):
 		self._base = b
 		self._top = t
@@ -28,7 +99,7 @@ class BiexponentialTransform(AbstractTransform):
 		x1 = x2 + w
 		x0 = x2 + 2 * w
 
-		self._b = (pd + nd) * np.log(b)
+		self._b = (pd + nd) * math.log(b)
 
 		# Math time! Gating-ML says the d parameter for the biexponential
 		# function is defined by:
@@ -49,23 +120,23 @@ class BiexponentialTransform(AbstractTransform):
 		# which we can solve using the Lambert W function as
 		#     x = c_2/c_1 * W( c_1/c_2 * exp(y/c_2) )
 		# I thought it was fun...
-		y = 2. * np.log(self._b) - w * self._b
-		self._d = 2. / w * lambertw(.5 * w * np.exp(.5 * y))
-
-		assert not np.iscomplex(self._d)
-		self._d = self._d.real
+		self._d = _solve_d(self._b, w)
 
 		# And the rest is directly from the Gating-ML spec:
-		c_a = np.exp(x0 * (self._b + self._d))
-		f_a = np.exp(self._b * x1) - c_a / np.exp(self._d * x1)
-		self._a = t / (np.exp(self._b) - f_a - c_a / np.exp(self._d))
+		c_a = math.exp(x0 * (self._b + self._d))
+		f_a = math.exp(self._b * x1) - c_a / math.exp(self._d * x1)
+		self._a = t / (math.exp(self._b) - f_a - c_a / math.exp(self._d))
 		self._c = c_a * self._a
 		self._f = f_a * self._a
 
 		# Make sure we ended up with real-values parameters
-		param_ok = lambda v: not np.isnan(v) and np.isfinite(v)
+		param_ok = lambda v: not math.isnan(v) and not math.isinf(v)
 		assert all(param_ok(getattr(self, '_' + n)) for n in 'abcdf')
 
+		# Negated exponent coefficient for the second exponential term, so
+		# apply_array_out() doesn't need to recompute it on each call
+		self._neg_d = -self._d
+
 	@property
 	def base(self):
 		return self._base
@@ -96,19 +167,46 @@ class BiexponentialTransform(AbstractTransform):
 		return LogicleTransform(**self.kwargs)
 
 	def apply_array(self, array):
-		return self._a * np.exp(self._b * array) \
-			- self._c * np.exp(-self._d * array) \
-			- self._f
+		return self.apply_array_out(array, empty_float_like(array),
+			empty_float_like(array), empty_float_like(array))
+
+	def apply_array_out(self, array, out, scratch_p, scratch_n):
+		"""
+		Same as apply_array() but writes into preallocated arrays instead of
+		creating temporaries.
+
+		Args:
+			array: numpy.ndarray. Values to transform.
+			out: numpy.ndarray. Float array of same shape to write result to.
+			scratch_p: numpy.ndarray. Float array of same shape, is left
+				containing the positive exponential term a * exp(b * array).
+			scratch_n: numpy.ndarray. Float array of same shape, is left
+				containing the negative exponential term c * exp(-d * array).
+
+		Returns:
+			numpy.ndarray. out.
+		"""
+		np.multiply(array, self._b, out=scratch_p)
+		np.exp(scratch_p, out=scratch_p)
+		scratch_p *= self._a
+		np.multiply(array, self._neg_d, out=scratch_n)
+		np.exp(scratch_n, out=scratch_n)
+		scratch_n *= self._c
+		np.subtract(scratch_p, scratch_n, out=out)
+		out -= self._f
+		return out
 
 	def array_in_domain(self, array):
-		return np.ones_like(array, dtype=np.bool)
+		return all_true_mask(array)
 
 
 class LogicleTransform(AbstractTransform):
 
+	unrestricted_domain = True
+
 	__transform_names__ = ['logicle']
 
-	def __init__(self, b=10, t=1, pd=4, ld=1, nd=0, niter=10):
+	def __init__(self, b=10, t=1, pd=4, ld=1, nd=0, niter=10, xtol=1e-9):
 		self._base = b
 		self._top = t
 		self._pos_decades = pd
@@ -117,8 +215,23 @@ class LogicleTransform(AbstractTransform):
 
 		self._niter = niter
 
+		# Tolerance (in transformed units) for stopping Newton iterations
+		# early. Raise this (e.g. to 1e-5, far below anything visible in a
+		# plot) to trade accuracy for fewer iterations.
+		self._xtol = xtol
+
 		self._inverse = BiexponentialTransform(b=b, t=t, pd=pd, ld=ld, nd=nd)
 
+		# Table of the inverse over the transform's output range [0, 1], for
+		# initial guesses by interpolation in apply_array()
+		self._guess_x = np.linspace(0., 1., 257)
+		self._guess_y = self._inverse.apply_array(self._guess_x)
+
+		# Value of the inverse at -w (in transformed units), below which
+		# initial guesses are made by inverting the negative exponential term
+		w = .2
+		self._thresh_n = float(self._inverse(-w))
+
 	@property
 	def base(self):
 		return self._base
@@ -156,31 +269,61 @@ class LogicleTransform(AbstractTransform):
 		# Grab the hidden parameters from the biexponential transform
 		a, b, c, d, f = tuple(getattr(self._inverse, '_' + n) for n in 'abcdf')
 
-		# Get an inital guess
-		x = np.zeros_like(array, dtype=np.float64)
+		# Get an inital guess by interpolating in the precomputed table of the
+		# inverse. This is already close within the table's range, so Newton's
+		# method only needs to polish it. Single precision input is computed
+		# in single precision.
+		x = np.asarray(np.interp(array, self._guess_y, self._guess_x),
+			dtype=float_dtype(array))
 
-		# Divide data into 3 regions, those where the value of the function
-		# will be greater than, less than, or close to zero.
-		w = .2
-		r_p = np.logical_and(array > self._inverse(w), array > -f)
-		r_n = np.logical_and(array < self._inverse(-w), array < -f)
+		# Outside of the table's range, values will be well above or below
+		# zero...
+		r_p = np.logical_and(array > self._guess_y[-1], array > -f)
+		r_n = np.logical_and(array < self._thresh_n, array < -f)
 
-		# Generate guesses by assuming one or both of the exponential
+		# ...so generate guesses there by assuming one of the exponential
 		# terms in the inverse to be close to 0 and inverting the
 		# remaining one
 		x[r_p] = np.log((array[r_p] + f) / a) / b
 		x[r_n] = np.log((array[r_n] + f) / -c) / -d
 
-		# Now, apply Newton's method to iteratively improve the guess
+		# Now, apply Newton's method to iteratively improve the guess. The
+		# two exponential terms are shared between the function value and its
+		# derivative so only compute them once per iteration, and intermediate
+		# values are written into buffers allocated once up front.
 		tol = 1e-9
-		for i in range(self._niter):
-			y = self._inverse(x) - array
-			dy = a * b * np.exp(b * x) + c * d * np.exp(-d * x)
 
-			t = np.abs(dy) > tol
-			x[t] -= (y / dy)[t]
+		# Steps can't get much smaller than the precision of the data type
+		step_tol = max(self._xtol, 4 * np.finfo(x.dtype).eps)
+		ae = np.empty_like(x)
+		ce = np.empty_like(x)
+		y = np.empty_like(x)
+		dy = np.empty_like(x)
+		step = np.empty_like(x)
+		t = np.empty(x.shape, dtype=np.bool_)
+		for i in range(self._niter):
+			# y = a * exp(b * x) - c * exp(-d * x) - f - array, leaves
+			# exponential terms in ae and ce
+			self._inverse.apply_array_out(x, y, ae, ce)
+			y -= array
+
+			# dy = a * b * exp(b * x) + c * d * exp(-d * x)
+			np.multiply(ae, b, out=dy)
+			np.multiply(ce, d, out=step)
+			dy += step
+
+			# Only update where derivative is not too close to zero
+			np.greater(np.abs(dy, out=step), tol, out=t)
+			step.fill(0)
+			np.divide(y, dy, out=step, where=t)
+			x -= step
+
+			# Convergence is quadratic, so stop early once every step is
+			# within tolerance
+			if step.size == 0 or np.abs(step, out=step).max() < step_tol:
+				break
 
 		return x
 
 	def array_in_domain(self, array):
-		return np.ones_like(array, dtype=np.bool)
+		return all_true_mask(array)
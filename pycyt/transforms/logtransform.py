@@ -1,6 +1,9 @@
+import math
+
 import numpy as np
 
-from abstracttransform import AbstractTransform
+from abstracttransform import (AbstractTransform, all_true_mask,
+	empty_float_like)
 
 
 class LogTransform(AbstractTransform):
@@ -13,8 +16,8 @@ class LogTransform(AbstractTransform):
 		self._top = t
 		self._shifted = s
 
-		self._scale = 1. / (d * np.log(b))
-		self._shift = -np.log(t) * self._scale
+		self._scale = 1. / (d * math.log(b))
+		self._shift = -math.log(t) * self._scale
 		if s:
 			self._shift += 1
 
@@ -59,7 +62,20 @@ class LogTransform(AbstractTransform):
 			return super(LogTransform, self).__repr__()
 
 	def apply_array(self, array):
-		return np.log(array) * self._scale + self._shift
+		# All steps in place in a single output array, shift is zero in the
+		# simple case so skip it
+		out = empty_float_like(array)
+		np.log(array, out=out)
+		out *= self._scale
+		if self._shift != 0:
+			out += self._shift
+		return out
+
+	def apply_scalar(self, x):
+		# Out of domain, let numpy give -inf or NaN
+		if not x > 0:
+			return AbstractTransform.apply_scalar(self, x)
+		return math.log(x) * self._scale + self._shift
 
 	def array_in_domain(self, array):
 		return array > 0
@@ -67,14 +83,16 @@ class LogTransform(AbstractTransform):
 
 class ExponentialTransform(AbstractTransform):
 
+	unrestricted_domain = True
+
 	def __init__(self, b=10, d=1, t=1, s=False):
 		self._base = b
 		self._decades = d
 		self._top = t
 		self._shifted = s
 
-		self._invscale = d * np.log(b)
-		self._shift = -np.log(t) / self._invscale
+		self._invscale = d * math.log(b)
+		self._shift = -math.log(t) / self._invscale
 		if s:
 			self._shift += 1
 
@@ -106,7 +124,11 @@ class ExponentialTransform(AbstractTransform):
 		return LogTransform(**self.kwargs)
 
 	def apply_array(self, array):
-		return np.exp((array - self._shift) * self._invscale)
+		# All steps in place in a single output array
+		out = empty_float_like(array)
+		np.subtract(array, self._shift, out=out)
+		out *= self._invscale
+		return np.exp(out, out=out)
 
 	def array_in_domain(self, array):
-		return np.ones_like(array, dtype=np.bool)
+		return all_true_mask(array)
@@ -1,4 +1,5 @@
 import collections
+from contextlib import contextmanager
 
 import numpy as np
 import pandas as pd
@@ -10,7 +11,23 @@ def cycle_adjacent(seq, n):
 	consecutive elements. For example, cycle_adjacent(range(5), 3) returns
 	[(0, 1, 2), (1, 2, 3), (2, 3, 4), (3, 4, 0), (4, 0, 1)].
 	Yields nothing for sequences of length less than n.
+
+	If seq is a numpy.ndarray, instead returns all of these at once as an
+	array of shape (len(seq), n) + seq.shape[1:] (built with a single fancy
+	indexing operation instead of a Python loop), which can be iterated
+	over in the same way.
 	"""
+	if isinstance(seq, np.ndarray):
+		m = len(seq)
+		if m < n:
+			return seq[:0][:, np.newaxis].repeat(n, axis=1)
+		return seq[(np.arange(m)[:, np.newaxis] + np.arange(n)) % m]
+	else:
+		return _cycle_adjacent_iter(seq, n)
+
+
+def _cycle_adjacent_iter(seq, n):
+	"""Generator implementation of cycle_adjacent() for general sequences"""
 	i = iter(seq)
 	start = collections.deque(maxlen=n)
 	for j in range(n):
@@ -60,37 +77,23 @@ class AutoIDMixin(object):
 		return ID
 
 
-class FileHandleManager(object):
+@contextmanager
+def open_file(file_, mode='r', **kwargs):
 	"""
 	Context manager which takes either an already-open file handle or a file
-	path in its constructor, and returns an open file handle from the
-	__enter__ method. If a file path was passed, the handle is opened on
-	__enter__ and closed on __exit__. Meant to be used in functions which take
-	either an open file handle or file path as an argument.
-	"""
+	path, and gives an open file handle. If a file path was passed, the handle
+	is opened on entering and closed on exit. Meant to be used in functions
+	which take either an open file handle or file path as an argument.
 
-	def __init__(self, file_, mode='r', **kwargs):
-		"""
-		Args:
-			file_: (stream object|basestring). Open file handle (or other
-				stream), or path to file to be opened.
-			mode: basestring. Mode to open file with, if file_ is a string.
-				Default 'r' for reading in text mode (same as open() default).
-			**kwargs: Passed to open() if needed.
-		"""
-		self.file_ = file_
-		self.mode = mode
-		self.kwargs = kwargs
-
-	def __enter__(self):
-		if isinstance(self.file_, basestring):
-			self.fh = open(self.file_, mode=self.mode, **self.kwargs)
-			self.needs_close = True
-		else:
-			self.fh = self.file_
-			self.needs_close = False
-		return self.fh
-
-	def __exit__(self, type, value, traceback):
-		if self.needs_close:
-			self.fh.close()
+	Args:
+		file_: (stream object|basestring). Open file handle (or other
+			stream), or path to file to be opened.
+		mode: basestring. Mode to open file with, if file_ is a string.
+			Default 'r' for reading in text mode (same as open() default).
+		**kwargs: Passed to open() if needed.
+	"""
+	if isinstance(file_, basestring):
+		with open(file_, mode, **kwargs) as fh:
+			yield fh
+	else:
+		yield file_